@@ -0,0 +1,9 @@
+"""
+Shared FastAPI dependencies for the e-commerce API
+"""
+from fastapi import Request
+from app.store import Store
+
+def get_store(request: Request) -> Store:
+    """Get the store instance from app state (tests override this dependency)"""
+    return request.app.state.store
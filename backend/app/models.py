@@ -3,7 +3,7 @@ Data models for the e-commerce application
 """
 from typing import List, Optional
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 
 class CartItem(BaseModel):
     """Represents an item in the cart"""
@@ -16,6 +16,18 @@ class Cart(BaseModel):
     """Represents a shopping cart"""
     user_id: str
     items: List[CartItem] = []
+    
+    @computed_field
+    @property
+    def item_count(self) -> int:
+        """Number of distinct items in the cart"""
+        return len(self.items)
+
+class CartSummary(BaseModel):
+    """Cart totals without the item list (GET /api/cart/{user_id}?summary=true)"""
+    user_id: str
+    item_count: int
+    subtotal: float
 
 class Order(BaseModel):
     """Represents an order"""
@@ -27,6 +39,7 @@ class Order(BaseModel):
     discount_amount: float = 0.0
     total: float
     created_at: datetime
+    items_quantity_total: int = 0  # Sum of item quantities, stored for statistics
 
 class DiscountCode(BaseModel):
     """Represents a discount code"""
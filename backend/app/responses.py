@@ -0,0 +1,46 @@
+"""
+Response helpers for the e-commerce API
+Serializes payloads with orjson and returns them as pre-built responses
+"""
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+def _default(obj: Any) -> Any:
+    """Fallback encoder for types orjson does not handle natively"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(payload: Any) -> bytes:
+    """
+    Encode a payload to JSON bytes
+
+    Args:
+        payload: Plain dicts/lists (datetimes and Pydantic models are allowed)
+
+    Returns:
+        orjson-encoded body
+    """
+    return orjson.dumps(payload, default=_default)
+
+def raw_json_response(body: bytes) -> Response:
+    """Wrap an already-encoded JSON body in a response"""
+    return Response(content=body, media_type="application/json")
+
+def json_response(payload: Any) -> Response:
+    """
+    Build a JSON response without going through jsonable_encoder
+
+    Args:
+        payload: Plain dicts/lists (datetimes and Pydantic models are allowed)
+
+    Returns:
+        Response with the orjson-encoded body
+    """
+    return raw_json_response(dumps(payload))
@@ -1,18 +1,20 @@
 """
 Admin API endpoints
 """
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
+from app.dependencies import get_store
 from app.models import DiscountCode
+from app.responses import json_response, raw_json_response
 from app.store import Store
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
-def get_store(request: Request) -> Store:
-    """Get the store instance from app state"""
-    return request.app.state.store
+# Last encoded statistics response: (store, stats_version, body)
+_stats_cache = (None, -1, b"")
 
-@router.post("/discount-code/generate", response_model=DiscountCode, summary="Generate discount code")
-def generate_discount_code(request: Request):
+@router.post("/discount-code/generate", responses={200: {"model": DiscountCode}}, summary="Generate discount code")
+async def generate_discount_code(store: Store = Depends(get_store)):
     """
     Manually generate a new discount code.
     
@@ -27,15 +29,14 @@ def generate_discount_code(request: Request):
     Returns:
         Generated discount code with creation timestamp
     """
-    store = get_store(request)
     try:
         discount = store.generate_discount_code()
-        return discount
+        return json_response(discount)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/statistics", summary="Get store statistics")
-def get_statistics(request: Request):
+async def get_statistics(store: Store = Depends(get_store)):
     """
     Retrieve comprehensive store statistics.
     
@@ -67,10 +68,15 @@ def get_statistics(request: Request):
     Returns:
         Dictionary containing all store statistics
     """
-    store = get_store(request)
+    global _stats_cache
     try:
-        stats = store.get_statistics()
-        return stats
+        cached_store, cached_version, body = _stats_cache
+        # Read the version before building so a concurrent change forces a rebuild
+        version = store.stats_version
+        if cached_store is not store or cached_version != version:
+            body = store.get_statistics_json()
+            _stats_cache = (store, version, body)
+        return raw_json_response(body)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,18 +1,31 @@
 """
 Cart API endpoints
 """
-from fastapi import APIRouter, HTTPException, Request
-from app.models import AddItemRequest, Cart
+from typing import Union
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from app.dependencies import get_store
+from app.models import AddItemRequest, Cart, CartSummary
+from app.responses import json_response
 from app.store import Store
+from app.validation import json_body_schema, parse_body
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
-def get_store(request: Request) -> Store:
-    """Get the store instance from app state"""
-    return request.app.state.store
+ADD_ITEM_ADAPTER = TypeAdapter(AddItemRequest)
 
-@router.post("/{user_id}/add", response_model=Cart, summary="Add item to cart")
-def add_item_to_cart(user_id: str, item: AddItemRequest, request: Request):
+def _empty_cart(user_id: str) -> dict:
+    """Response body for a user without a cart"""
+    return {"user_id": user_id, "items": [], "item_count": 0}
+
+@router.post(
+    "/{user_id}/add",
+    responses={200: {"model": Cart}},
+    summary="Add item to cart",
+    openapi_extra=json_body_schema(AddItemRequest)
+)
+async def add_item_to_cart(user_id: str, request: Request, store: Store = Depends(get_store)):
     """
     Add an item to the user's cart.
     
@@ -31,12 +44,12 @@ def add_item_to_cart(user_id: str, item: AddItemRequest, request: Request):
     
     Args:
         user_id: Unique identifier for the user
-        item: Item details to add to cart
+        request: Request whose JSON body holds the item details (AddItemRequest)
         
     Returns:
         Updated cart with the new item added
     """
-    store = get_store(request)
+    item = await parse_body(ADD_ITEM_ADAPTER, request)
     try:
         cart = store.add_item_to_cart(
             user_id=user_id,
@@ -45,32 +58,44 @@ def add_item_to_cart(user_id: str, item: AddItemRequest, request: Request):
             price=item.price,
             quantity=item.quantity
         )
-        return cart
+        return json_response(cart)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/{user_id}", response_model=Cart, summary="Get user's cart")
-def get_cart(user_id: str, request: Request):
+@router.get(
+    "/{user_id}",
+    responses={200: {"model": Union[Cart, CartSummary]}},
+    summary="Get user's cart"
+)
+async def get_cart(user_id: str, summary: bool = False, store: Store = Depends(get_store)):
     """
     Retrieve the user's shopping cart.
     
     If the user doesn't have a cart, returns an empty cart.
+    With `?summary=true` only the user_id, item_count and subtotal are
+    returned, without the item list.
     
     Args:
         user_id: Unique identifier for the user
+        summary: Return only the cart totals (default: false)
         
     Returns:
-        User's cart with all items
+        User's cart with all items, or its summary
     """
-    store = get_store(request)
+    if summary:
+        cart_summary = store.get_cart_summary(user_id)
+        if not cart_summary:
+            return json_response({"user_id": user_id, "item_count": 0, "subtotal": 0.0})
+        return json_response(cart_summary)
+    
     cart = store.get_cart(user_id)
-    if not cart:
+    if cart is None:
         # Return empty cart if none exists
-        return Cart(user_id=user_id, items=[])
-    return cart
+        cart = _empty_cart(user_id)
+    return json_response(cart)
 
-@router.delete("/{user_id}/item/{item_id}", response_model=Cart)
-def remove_item_from_cart(user_id: str, item_id: str, request: Request):
+@router.delete("/{user_id}/item/{item_id}", responses={200: {"model": Cart}})
+async def remove_item_from_cart(user_id: str, item_id: str, store: Store = Depends(get_store)):
     """
     Remove an item from the user's cart
     
@@ -81,14 +106,13 @@ def remove_item_from_cart(user_id: str, item_id: str, request: Request):
     Returns:
         Updated cart
     """
-    store = get_store(request)
     cart = store.remove_item_from_cart(user_id, item_id)
     if cart is None:
-        return Cart(user_id=user_id, items=[])
-    return cart
+        cart = _empty_cart(user_id)
+    return json_response(cart)
 
 @router.delete("/{user_id}/clear")
-def clear_cart(user_id: str, request: Request):
+async def clear_cart(user_id: str, store: Store = Depends(get_store)):
     """
     Clear the user's cart
     
@@ -98,7 +122,6 @@ def clear_cart(user_id: str, request: Request):
     Returns:
         Success message
     """
-    store = get_store(request)
     store.clear_cart(user_id)
     return {"message": "Cart cleared successfully"}
 
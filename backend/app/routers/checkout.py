@@ -1,18 +1,26 @@
 """
 Checkout API endpoints
 """
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from app.dependencies import get_store
 from app.models import CheckoutRequest, CheckoutResponse
+from app.responses import json_response
 from app.store import Store
+from app.validation import json_body_schema, parse_body
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
-def get_store(request: Request) -> Store:
-    """Get the store instance from app state"""
-    return request.app.state.store
+CHECKOUT_ADAPTER = TypeAdapter(CheckoutRequest)
 
-@router.post("/{user_id}", response_model=CheckoutResponse, summary="Process checkout")
-def checkout(user_id: str, checkout_request: CheckoutRequest, request: Request):
+@router.post(
+    "/{user_id}",
+    responses={200: {"model": CheckoutResponse}},
+    summary="Process checkout",
+    openapi_extra=json_body_schema(CheckoutRequest)
+)
+async def checkout(user_id: str, request: Request, store: Store = Depends(get_store)):
     """
     Process checkout for the user's cart.
     
@@ -39,7 +47,7 @@ def checkout(user_id: str, checkout_request: CheckoutRequest, request: Request):
     
     Args:
         user_id: Unique identifier for the user
-        checkout_request: Checkout details including optional discount code
+        request: Request whose JSON body holds the checkout details (CheckoutRequest)
         
     Returns:
         Order details including order_id, items, totals, and discount information
@@ -47,7 +55,7 @@ def checkout(user_id: str, checkout_request: CheckoutRequest, request: Request):
     Raises:
         HTTPException 400: If cart is empty or discount code is invalid/already used
     """
-    store = get_store(request)
+    checkout_request = await parse_body(CHECKOUT_ADAPTER, request)
     
     try:
         order = store.create_order(
@@ -55,16 +63,16 @@ def checkout(user_id: str, checkout_request: CheckoutRequest, request: Request):
             discount_code=checkout_request.discount_code
         )
         
-        return CheckoutResponse(
-            order_id=order.order_id,
-            user_id=order.user_id,
-            items=order.items,
-            subtotal=order.subtotal,
-            discount_code=order.discount_code,
-            discount_amount=order.discount_amount,
-            total=order.total,
-            created_at=order.created_at.isoformat()
-        )
+        return json_response({
+            "order_id": order.order_id,
+            "user_id": order.user_id,
+            "items": order.items,
+            "subtotal": order.subtotal,
+            "discount_code": order.discount_code,
+            "discount_amount": order.discount_amount,
+            "total": order.total,
+            "created_at": order.created_at
+        })
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -1,41 +1,157 @@
 """
 Store for the e-commerce application
 Manages carts, orders, discount codes, and statistics
-Uses JSON file-based persistence for data durability
+Uses JSON file-based persistence for data durability: orders and discount
+codes go to append-only JSONL logs, carts and counters to a small JSON snapshot
+Writes are batched: mutations mark the store dirty and flush() saves them
 """
-import json
+import functools
+import math
 import os
+import threading
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from app.models import Cart, CartItem, Order, DiscountCode
+import orjson
+from app.models import CartItem, Order, DiscountCode
+
+# Number of locks shared out among carts by hash of user_id
+CART_LOCK_STRIPES = 64
+
+def _synchronized(method):
+    """Run a Store method while holding the store lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _synchronized_cart(method):
+    """Run a Store method while holding the lock for its user_id's cart"""
+    @functools.wraps(method)
+    def wrapper(self, user_id, *args, **kwargs):
+        with self._cart_lock(user_id):
+            return method(self, user_id, *args, **kwargs)
+    return wrapper
+
+@dataclass
+class CartItemInternal:
+    """
+    Cart line as kept inside the Store
+    
+    A slotted dataclass rather than a Pydantic model: no per-instance dict or
+    validation machinery, and orjson serializes it natively. Carts are
+    returned as plain dicts built with to_dict().
+    """
+    __slots__ = ('item_id', 'name', 'price', 'quantity')
+    item_id: str
+    name: str
+    price: float
+    quantity: int
+    
+    def to_dict(self) -> dict:
+        """Plain dict form used for order items"""
+        return {
+            'item_id': self.item_id,
+            'name': self.name,
+            'price': self.price,
+            'quantity': self.quantity
+        }
 
 class Store:
     """
     Store for managing e-commerce data with JSON file-based persistence
     
-    Data is maintained in memory during runtime and automatically persisted
-    to a JSON file for durability across server restarts.
+    Data is maintained in memory during runtime and persisted to disk for
+    durability across server restarts. Orders and discount code changes are
+    appended to JSONL logs next to the data file, so each write is
+    proportional to what changed; the data file itself only holds carts and
+    counters. Mutations only mark the store as
+    dirty; flush() writes the latest state, so a burst of changes costs one
+    write. start_writer() runs flushes on a background thread (the API does
+    this for its lifetime).
+    
+    Cart operations only lock the user's own cart (one of a fixed set of
+    striped locks), so different users' carts can be updated in parallel.
+    Orders, discount codes and snapshots take the store lock; create_order
+    takes the cart lock first, then the store lock, and nothing acquires
+    them in the opposite order.
     """
-    def __init__(self, n: int = 5, data_file: str = "data/store.json"):
+    def __init__(self, n: int = 5, data_file: str = "data/store.json", persist: bool = True):
         """
         Initialize the store
         
         Args:
             n: Every nth order gets a discount code (default: 5)
-            data_file: Path to JSON file for persistence (default: "data/store.json")
+            data_file: Path to JSON file for persistence (default: "data/store.json").
+                Order and discount code logs are kept alongside it, e.g.
+                data/store.orders.jsonl and data/store.discounts.jsonl
+            persist: Load from and save to data_file (default: True). With
+                False the store is memory-only and never touches the disk
         """
         self.n = n  # Every nth order gets a discount code
         self.data_file = data_file
-        self.carts: Dict[str, Cart] = {}  # user_id -> Cart
+        self.persist = persist
+        self.orders_file = str(Path(data_file).with_suffix('.orders.jsonl'))
+        self.discounts_file = str(Path(data_file).with_suffix('.discounts.jsonl'))
+        self.carts: Dict[str, Dict[str, CartItemInternal]] = {}  # user_id -> item_id -> item
         self.orders: List[Order] = []
         self.discount_codes: List[DiscountCode] = []
+        self._discount_index: Dict[str, DiscountCode] = {}  # code -> DiscountCode
+        # code -> encoded get_statistics() entry, refreshed only when the code changes
+        self._discount_entries: Dict[str, bytes] = {}
         self.order_count = 0
+        # Sequence numbers for the next order id and discount code
+        self._next_order_seq = 1
+        self._next_discount_seq = 1
+        # Running totals maintained by create_order for get_statistics
+        self._total_items_purchased = 0
+        self._total_purchase_amount = 0.0
+        self._total_discount_amount = 0.0
+        # Bumped whenever get_statistics() output changes, used to cache responses
+        self.stats_version = 0
+        self._dirty = False
+        # Encoded log records waiting for the next flush
+        self._pending_order_lines: List[bytes] = []
+        self._pending_discount_lines: List[bytes] = []
+        # Guards orders, discount codes and counters; reentrant because
+        # create_order calls other methods
+        self._lock = threading.RLock()
+        # Fixed set of cart locks, picked by hash of user_id (see _cart_lock)
+        self._cart_locks = [threading.RLock() for _ in range(CART_LOCK_STRIPES)]
+        self._save_lock = threading.Lock()
+        # Background writer state (see start_writer)
+        self._dirty_event = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_stop = threading.Event()
+        self._flush_interval = 0.0
         
         # Load data from file if it exists
-        self._load_data()
+        if self.persist:
+            self._load_data()
+    
+    def _cart_dict(self, user_id: str, items: Dict[str, CartItemInternal]) -> Dict:
+        """
+        Cart as plain data in the Cart model's shape, without building
+        Pydantic models (the API encodes it straight to JSON)
+        
+        Args:
+            user_id: Unique identifier for the user
+            items: Mapping of item_id -> CartItemInternal for the user
+            
+        Returns:
+            Dictionary with user_id, items and item_count (a snapshot; later
+            cart changes are not reflected)
+        """
+        return {
+            "user_id": user_id,
+            "items": [item.to_dict() for item in items.values()],
+            "item_count": len(items)
+        }
     
-    def get_or_create_cart(self, user_id: str) -> Cart:
+    @_synchronized_cart
+    def get_or_create_cart(self, user_id: str) -> Dict:
         """
         Get existing cart or create a new one for a user
         
@@ -43,13 +159,12 @@ class Store:
             user_id: Unique identifier for the user
             
         Returns:
-            Cart object for the user
+            Cart for the user (see _cart_dict)
         """
-        if user_id not in self.carts:
-            self.carts[user_id] = Cart(user_id=user_id, items=[])
-        return self.carts[user_id]
+        return self._cart_dict(user_id, self.carts.setdefault(user_id, {}))
     
-    def add_item_to_cart(self, user_id: str, item_id: str, name: str, price: float, quantity: int) -> Cart:
+    @_synchronized_cart
+    def add_item_to_cart(self, user_id: str, item_id: str, name: str, price: float, quantity: int) -> Dict:
         """
         Add an item to the user's cart
         
@@ -61,32 +176,25 @@ class Store:
             quantity: Quantity to add
             
         Returns:
-            Updated Cart object
-        """
-        cart = self.get_or_create_cart(user_id)
-        
-        # Check if item already exists in cart
-        for cart_item in cart.items:
-            if cart_item.item_id == item_id:
-                cart_item.quantity += quantity
-                # Persist data
-                self._save_data()
-                return cart
-        
-        # Add new item to cart
-        cart.items.append(CartItem(
-            item_id=item_id,
-            name=name,
-            price=price,
-            quantity=quantity
-        ))
+            Updated cart (see _cart_dict)
+        """
+        items = self.carts.setdefault(user_id, {})
         
-        # Persist data
-        self._save_data()
+        cart_item = items.get(item_id)
+        if cart_item:
+            # Item already in cart, increment quantity
+            cart_item.quantity += quantity
+        else:
+            # Add new item to cart (fields were already validated by AddItemRequest)
+            items[item_id] = CartItemInternal(item_id, name, price, quantity)
         
-        return cart
+        # Mark state for the next flush
+        self._mark_dirty()
+        
+        return self._cart_dict(user_id, items)
     
-    def remove_item_from_cart(self, user_id: str, item_id: str) -> Optional[Cart]:
+    @_synchronized_cart
+    def remove_item_from_cart(self, user_id: str, item_id: str) -> Optional[Dict]:
         """
         Remove an item from the user's cart
         
@@ -95,20 +203,20 @@ class Store:
             item_id: Unique identifier for the item
             
         Returns:
-            Updated Cart object or None if cart doesn't exist
+            Updated cart (see _cart_dict) or None if cart doesn't exist
         """
-        if user_id not in self.carts:
+        items = self.carts.get(user_id)
+        if items is None:
             return None
+        items.pop(item_id, None)
         
-        cart = self.carts[user_id]
-        cart.items = [item for item in cart.items if item.item_id != item_id]
-        
-        # Persist data
-        self._save_data()
+        # Mark state for the next flush
+        self._mark_dirty()
         
-        return cart
+        return self._cart_dict(user_id, items)
     
-    def get_cart(self, user_id: str) -> Optional[Cart]:
+    @_synchronized_cart
+    def get_cart(self, user_id: str) -> Optional[Dict]:
         """
         Get the cart for a user
         
@@ -116,10 +224,35 @@ class Store:
             user_id: Unique identifier for the user
             
         Returns:
-            Cart object or None if cart doesn't exist
+            Cart (see _cart_dict) or None if cart doesn't exist
         """
-        return self.carts.get(user_id)
+        items = self.carts.get(user_id)
+        if items is None:
+            return None
+        return self._cart_dict(user_id, items)
     
+    @_synchronized_cart
+    def get_cart_summary(self, user_id: str) -> Optional[Dict]:
+        """
+        Get item count and subtotal for a user's cart without building it
+        
+        Args:
+            user_id: Unique identifier for the user
+            
+        Returns:
+            Dictionary with user_id, item_count and subtotal, or None if
+            cart doesn't exist
+        """
+        items = self.carts.get(user_id)
+        if items is None:
+            return None
+        return {
+            "user_id": user_id,
+            "item_count": len(items),
+            "subtotal": math.fsum([item.price * item.quantity for item in items.values()])
+        }
+    
+    @_synchronized_cart
     def clear_cart(self, user_id: str) -> None:
         """
         Clear the cart for a user
@@ -129,9 +262,11 @@ class Store:
         """
         if user_id in self.carts:
             del self.carts[user_id]
-            # Persist data
-            self._save_data()
+            # Mark state for the next flush
+            self._mark_dirty()
     
+    @_synchronized_cart
+    @_synchronized
     def create_order(self, user_id: str, discount_code: Optional[str] = None) -> Order:
         """
         Create an order from the user's cart
@@ -143,58 +278,48 @@ class Store:
         Returns:
             Created Order object
         """
-        cart = self.get_cart(user_id)
-        if not cart or not cart.items:
+        cart_items = self.carts.get(user_id)
+        if not cart_items:
             raise ValueError("Cart is empty")
         
-        # Calculate subtotal
-        subtotal = sum(item.price * item.quantity for item in cart.items)
+        # Read the clock once; the order, discount usage and any new code share it
+        now = datetime.now()
+        
+        # Calculate subtotal (fsum accumulates in C and avoids float drift)
+        subtotal = math.fsum([item.price * item.quantity for item in cart_items.values()])
         
         # Validate and apply discount code
         discount_amount = 0.0
         applied_discount_code = None
         
         if discount_code:
-            discount = self.validate_discount_code(discount_code)
-            if discount and self.order_count % self.n == 0:
-                discount_amount = subtotal * 0.10  # 10% discount
-                applied_discount_code = discount_code
-                discount.used = True
-                discount.used_at = datetime.now()
-            elif discount and self.order_count % self.n != 0:
-                raise ValueError(f"Discount code can only be used on every {self.n}th order")
-            else:
+            discount = self._discount_index.get(discount_code)
+            if not discount or discount.used:
                 raise ValueError("Invalid or already used discount code")
+            if self.order_count % self.n != 0:
+                raise ValueError(f"Discount code can only be used on every {self.n}th order")
+            discount_amount = subtotal * 0.10  # 10% discount
+            applied_discount_code = discount_code
+            discount.used = True
+            discount.used_at = now
+            self._discount_changed(discount)
         
-        total = subtotal - discount_amount
-        
-        # Create order
-        order = Order(
-            order_id=f"ORD-{len(self.orders) + 1:06d}",
+        order = self._record_order(
             user_id=user_id,
-            items=[item.model_dump() for item in cart.items],
+            items=[item.to_dict() for item in cart_items.values()],
             subtotal=subtotal,
             discount_code=applied_discount_code,
             discount_amount=discount_amount,
-            total=total,
-            created_at=datetime.now()
+            items_quantity_total=sum(item.quantity for item in cart_items.values()),
+            created_at=now
         )
         
-        self.orders.append(order)
-        self.order_count += 1
-        
-        # Check if this is the nth order and generate discount code
-        if self.order_count % self.n == 0:
-            self.generate_discount_code()
-        
         # Clear cart after order
         self.clear_cart(user_id)
         
-        # Persist data (order and discount code changes)
-        self._save_data()
-        
         return order
     
+    @_synchronized
     def validate_discount_code(self, code: str) -> Optional[DiscountCode]:
         """
         Validate if a discount code is valid and available
@@ -205,32 +330,42 @@ class Store:
         Returns:
             DiscountCode object if valid, None otherwise
         """
-        for discount in self.discount_codes:
-            if discount.code == code and not discount.used:
-                return discount
+        discount = self._discount_index.get(code)
+        if discount and not discount.used:
+            return discount
         return None
     
-    def generate_discount_code(self) -> DiscountCode:
+    @_synchronized
+    def generate_discount_code(self, created_at: Optional[datetime] = None) -> DiscountCode:
         """
         Generate a new discount code (called every nth order)
         
+        Args:
+            created_at: Creation timestamp (default: current time)
+            
         Returns:
             Created DiscountCode object
         """
-        code = f"SAVE10-{len(self.discount_codes) + 1:04d}"
-        discount = DiscountCode(
+        seq = self._next_discount_seq
+        self._next_discount_seq += 1
+        code = "SAVE10-" + str(seq).zfill(4)
+        discount = DiscountCode.model_construct(
             code=code,
             discount_percent=10,
-            created_at=datetime.now(),
+            created_at=created_at or datetime.now(),
             used=False
         )
         self.discount_codes.append(discount)
+        self._discount_changed(discount)
+        self._discount_index[code] = discount
+        self.stats_version += 1
         
-        # Persist data
-        self._save_data()
+        # Mark state for the next flush
+        self._mark_dirty()
         
         return discount
     
+    @_synchronized
     def get_statistics(self) -> Dict:
         """
         Get store statistics for admin
@@ -238,130 +373,560 @@ class Store:
         Returns:
             Dictionary containing statistics
         """
-        total_items_purchased = sum(
-            sum(item['quantity'] for item in order.items)
-            for order in self.orders
-        )
-        
-        total_purchase_amount = sum(order.total for order in self.orders)
-        
-        total_discount_amount = sum(order.discount_amount for order in self.orders)
-        
-        discount_codes_list = [
-            {
-                "code": dc.code,
-                "created_at": dc.created_at.isoformat(),
-                "used": dc.used,
-                "used_at": dc.used_at.isoformat() if dc.used_at else None
-            }
-            for dc in self.discount_codes
-        ]
+        discount_codes_list = [self._discount_entry(dc) for dc in self.discount_codes]
         
         return {
-            "total_items_purchased": total_items_purchased,
-            "total_purchase_amount": round(total_purchase_amount, 2),
-            "total_discount_amount": round(total_discount_amount, 2),
+            "total_items_purchased": self._total_items_purchased,
+            "total_purchase_amount": round(self._total_purchase_amount, 2),
+            "total_discount_amount": round(self._total_discount_amount, 2),
             "discount_codes": discount_codes_list,
             "total_orders": len(self.orders)
         }
     
-    def _load_data(self) -> None:
+    @_synchronized
+    def get_statistics_json(self) -> bytes:
+        """
+        Get store statistics for admin, already encoded as JSON
+        
+        Same content as get_statistics(), but the discount code entries are
+        spliced in from bytes encoded when each code last changed.
+        
+        Returns:
+            JSON-encoded statistics
         """
-        Load data from JSON file if it exists
+        head = orjson.dumps({
+            "total_items_purchased": self._total_items_purchased,
+            "total_purchase_amount": round(self._total_purchase_amount, 2),
+            "total_discount_amount": round(self._total_discount_amount, 2)
+        })
+        return b"".join((
+            head[:-1],
+            b',"discount_codes":[',
+            b",".join(self._discount_entries.values()),
+            b'],"total_orders":',
+            str(len(self.orders)).encode(),
+            b"}"
+        ))
+    
+    @_synchronized
+    def reset(self) -> None:
         """
-        try:
-            data_path = Path(self.data_file)
-            if data_path.exists():
-                with open(data_path, 'r') as f:
-                    data = json.load(f)
-                
-                # Load carts
-                self.carts = {}
-                for user_id, cart_data in data.get('carts', {}).items():
-                    items = [CartItem(**item) for item in cart_data.get('items', [])]
-                    self.carts[user_id] = Cart(user_id=user_id, items=items)
+        Discard all in-memory data (test-only: reuses one store across tests)
+        
+        Only allowed on a memory-only store (persist=False). A persistent
+        store would restart its order and discount sequences while the logs
+        on disk still hold the old ids.
+        
+        Raises:
+            RuntimeError: If the store persists to disk
+        """
+        if self.persist:
+            raise RuntimeError("reset() is only allowed on a store created with persist=False")
+        self._clear_data()
+        self._dirty = False
+        # Bump rather than reset so cached statistics responses are invalidated
+        self.stats_version += 1
+    
+    @_synchronized
+    def _simulate_orders(self, count: int, user_prefix: str = "u") -> List[Order]:
+        """
+        Record orders directly, without carts (for tests)
+        
+        Each order is one unit of a 1.00 item for user_prefix + index. Order
+        ids, totals and the every-nth-order discount codes are handled
+        exactly as in create_order.
+        
+        Args:
+            count: Number of orders to record
+            user_prefix: Prefix for the generated user ids (default: "u")
+            
+        Returns:
+            Created Order objects
+        """
+        now = datetime.now()
+        return [
+            self._record_order(
+                user_id=f"{user_prefix}{i}",
+                items=[{'item_id': 'item', 'name': 'Item', 'price': 1.0, 'quantity': 1}],
+                subtotal=1.0,
+                discount_code=None,
+                discount_amount=0.0,
+                items_quantity_total=1,
+                created_at=now
+            )
+            for i in range(count)
+        ]
+    
+    def flush(self) -> bool:
+        """
+        Save state to the data files if anything changed since the last flush
+        
+        Returns:
+            True if data was written, False if there was nothing to save or
+            the write failed (the changes are then kept for the next flush)
+        """
+        snapshot = self.take_snapshot()
+        if snapshot is None:
+            return False
+        if not self.write_snapshot(snapshot):
+            self._restore_snapshot(snapshot)
+            return False
+        return True
+    
+    @_synchronized
+    def take_snapshot(self) -> Optional[Tuple[bytes, List[bytes], List[bytes]]]:
+        """
+        Collect pending changes if anything changed since the last snapshot
+        
+        Returns:
+            (encoded data file, order log records, discount log records),
+            or None if there is nothing to save
+        """
+        if not self._dirty:
+            return None
+        # Clear first so later changes trigger another snapshot
+        self._dirty = False
+        order_lines = self._pending_order_lines
+        discount_lines = self._pending_discount_lines
+        self._pending_order_lines = []
+        self._pending_discount_lines = []
+        return self._serialize_data(), order_lines, discount_lines
+    
+    def write_snapshot(self, snapshot: Tuple[bytes, List[bytes], List[bytes]]) -> bool:
+        """
+        Write a snapshot to disk (safe to call from a worker thread)
+        
+        Args:
+            snapshot: Data from take_snapshot()
+            
+        Returns:
+            True if everything was written, False if the write failed
+        """
+        data, order_lines, discount_lines = snapshot
+        with self._save_lock:
+            try:
+                data_path = Path(self.data_file)
+                # Create directory if it doesn't exist
+                data_path.parent.mkdir(parents=True, exist_ok=True)
                 
-                # Load orders
-                self.orders = []
-                for order_data in data.get('orders', []):
-                    # Convert datetime strings back to datetime objects
-                    order_data['created_at'] = datetime.fromisoformat(order_data['created_at'])
-                    self.orders.append(Order(**order_data))
+                # Append new log records before the data file that counts them
+                for log_file, lines in ((self.orders_file, order_lines),
+                                        (self.discounts_file, discount_lines)):
+                    if lines:
+                        self._append_log(log_file, lines)
                 
-                # Load discount codes
-                self.discount_codes = []
-                for dc_data in data.get('discount_codes', []):
-                    dc_data['created_at'] = datetime.fromisoformat(dc_data['created_at'])
-                    if dc_data.get('used_at'):
-                        dc_data['used_at'] = datetime.fromisoformat(dc_data['used_at'])
-                    self.discount_codes.append(DiscountCode(**dc_data))
+                # Write to file atomically (write to temp file, then rename)
+                temp_file = str(data_path) + '.tmp'
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
                 
-                # Load order count
-                self.order_count = data.get('order_count', len(self.orders))
-                self.n = data.get('n', self.n)
+                # Atomic rename
+                os.replace(temp_file, data_path)
+                return True
                 
-        except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
-            # If file doesn't exist or is corrupted, start fresh
-            print(f"Could not load data from {self.data_file}: {e}. Starting with empty store.")
+            except Exception as e:
+                print(f"Error saving data to {self.data_file}: {e}")
+                # Don't raise - allow operations to continue even if save fails
+                return False
+    
+    def start_writer(self, flush_interval: float = 0.1) -> None:
+        """
+        Start a background thread that writes changes to disk
+        
+        Args:
+            flush_interval: Seconds to wait after a change so that a burst of
+                changes is written once (default: 0.1)
+        """
+        if self._writer is not None or not self.persist:
+            return
+        self._flush_interval = flush_interval
+        self._writer_stop.clear()
+        self._writer = threading.Thread(target=self._writer_loop, name="store-writer", daemon=True)
+        self._writer.start()
+    
+    def stop_writer(self) -> None:
+        """
+        Stop the background writer and save any pending changes
+        """
+        if self._writer is not None:
+            self._writer_stop.set()
+            self._dirty_event.set()
+            self._writer.join()
+            self._writer = None
+        self.flush()
+    
+    def _writer_loop(self) -> None:
+        """
+        Wait for changes and flush them, coalescing bursts into one write
+        """
+        while not self._writer_stop.is_set():
+            self._dirty_event.wait()
+            # Let a burst of changes accumulate (returns early when stopping)
+            self._writer_stop.wait(self._flush_interval)
+            # Clear before flushing so changes made during the write wake us again
+            self._dirty_event.clear()
+            self.flush()
+    
+    @_synchronized
+    def _restore_snapshot(self, snapshot: Tuple[bytes, List[bytes], List[bytes]]) -> None:
+        """
+        Put the log records of a snapshot that failed to write back in front
+        of the pending ones, so the next flush retries them
+        
+        Records that did reach the log before the failure are written again;
+        loading ignores the duplicates.
+        
+        Args:
+            snapshot: Data from take_snapshot()
+        """
+        _, order_lines, discount_lines = snapshot
+        self._pending_order_lines[:0] = order_lines
+        self._pending_discount_lines[:0] = discount_lines
+        self._mark_dirty()
+    
+    def _cart_lock(self, user_id: str) -> threading.RLock:
+        """
+        Get the lock guarding a user's cart
+        
+        Locks are striped: users share a fixed set of locks, so memory does
+        not grow with the number of user ids seen. Users on the same stripe
+        just wait for each other.
+        
+        Args:
+            user_id: Unique identifier for the user
+            
+        Returns:
+            Reentrant lock guarding that user's cart
+        """
+        return self._cart_locks[hash(user_id) % CART_LOCK_STRIPES]
+    
+    def _record_order(self, user_id: str, items: List[dict], subtotal: float,
+                      discount_code: Optional[str], discount_amount: float,
+                      items_quantity_total: int, created_at: datetime) -> Order:
+        """
+        Add an order and update counters, totals and nth-order discount codes
+        
+        Caller must hold the store lock and have applied the discount already.
+        
+        Returns:
+            Created Order object
+        """
+        total = subtotal - discount_amount
+        
+        # Create order
+        order_seq = self._next_order_seq
+        self._next_order_seq += 1
+        order = Order.model_construct(
+            order_id="ORD-" + str(order_seq).zfill(6),
+            user_id=user_id,
+            items=items,
+            subtotal=subtotal,
+            discount_code=discount_code,
+            discount_amount=discount_amount,
+            total=total,
+            created_at=created_at,
+            items_quantity_total=items_quantity_total
+        )
+        
+        self.orders.append(order)
+        if self.persist:
+            self._pending_order_lines.append(orjson.dumps(self._order_record(order)))
+        self.order_count += 1
+        self._total_items_purchased += items_quantity_total
+        self._total_purchase_amount += total
+        self._total_discount_amount += discount_amount
+        self.stats_version += 1
+        
+        # Check if this is the nth order and generate discount code
+        if self.order_count % self.n == 0:
+            self.generate_discount_code(created_at=created_at)
+        
+        # Mark state for the next flush (order and discount code changes)
+        self._mark_dirty()
+        
+        return order
+    
+    def _discount_changed(self, discount: DiscountCode) -> None:
+        """
+        Queue the current state of a discount code for the discount log and
+        refresh its encoded statistics entry
+        
+        Args:
+            discount: Discount code that was created or used
+        """
+        if self.persist:
+            self._pending_discount_lines.append(orjson.dumps(self._discount_record(discount)))
+        self._discount_entries[discount.code] = orjson.dumps(self._discount_entry(discount))
+    
+    def _mark_dirty(self) -> None:
+        """
+        Record that in-memory state differs from the JSON file
+        """
+        if not self.persist:
+            return
+        self._dirty = True
+        self._dirty_event.set()
+    
+    def _load_data(self) -> None:
+        """
+        Load data from the data file and logs if they exist
+        
+        The logs are the record of orders and discount codes, so they are
+        replayed even if the data file is corrupt; only carts and counters
+        are lost then. Records that can't be parsed are skipped with a
+        warning. Unreadable log files raise rather than risk reissuing ids.
+        """
+        data = self._read_snapshot()
+        
+        # Load carts
+        self.carts = {}
+        try:
+            for user_id, cart_data in data.get('carts', {}).items():
+                self.carts[user_id] = {}
+                for item_data in cart_data.get('items', []):
+                    item = CartItem.model_validate(item_data)
+                    self.carts[user_id][item.item_id] = CartItemInternal(
+                        item.item_id, item.name, item.price, item.quantity
+                    )
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            print(f"Could not load carts from {self.data_file}: {e}. Starting with empty carts.")
             self.carts = {}
-            self.orders = []
-            self.discount_codes = []
-            self.order_count = 0
+        
+        # Older data files embed orders and discount codes; move them to the logs
+        legacy_orders = data.get('orders') if not Path(self.orders_file).exists() else None
+        legacy_discounts = (
+            data.get('discount_codes') if not Path(self.discounts_file).exists() else None
+        )
+        legacy_orders = legacy_orders if isinstance(legacy_orders, list) else []
+        legacy_discounts = legacy_discounts if isinstance(legacy_discounts, list) else []
+        
+        # Load orders (a record rewritten after a failed flush appears twice)
+        orders: Dict[str, Order] = {}
+        for order_data in legacy_orders + self._read_log(self.orders_file):
+            try:
+                order = self._parse_order(order_data)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping invalid order record in {self.orders_file}: {e!r}")
+                continue
+            orders.setdefault(order.order_id, order)
+        self.orders = list(orders.values())
+        
+        # Load discount codes (the last record for a code is its current state)
+        discounts: Dict[str, DiscountCode] = {}
+        for dc_data in legacy_discounts + self._read_log(self.discounts_file):
+            try:
+                discount = self._parse_discount(dc_data)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping invalid discount code record in {self.discounts_file}: {e!r}")
+                continue
+            discounts[discount.code] = discount
+        self.discount_codes = list(discounts.values())
+        self._discount_index = discounts
+        self._discount_entries = {
+            dc.code: orjson.dumps(self._discount_entry(dc)) for dc in self.discount_codes
+        }
+        
+        # Load order count
+        saved_order_count = data.get('order_count', 0)
+        if not isinstance(saved_order_count, int):
+            saved_order_count = 0
+        self.order_count = max(saved_order_count, len(self.orders))
+        
+        # Continue after the highest issued number, even if records were
+        # skipped, so an id or code is never handed out twice
+        self._next_order_seq = max(
+            [self.order_count] + [self._sequence_number(order.order_id) for order in self.orders]
+        ) + 1
+        self._next_discount_seq = max(
+            [len(self.discount_codes)] + [self._sequence_number(code) for code in discounts]
+        ) + 1
+        saved_n = data.get('n', self.n)
+        if isinstance(saved_n, int) and saved_n > 0:
+            self.n = saved_n
+        
+        # Rebuild running totals from the orders
+        self._total_items_purchased = sum(order.items_quantity_total for order in self.orders)
+        self._total_purchase_amount = sum(order.total for order in self.orders)
+        self._total_discount_amount = sum(order.discount_amount for order in self.orders)
+        
+        if legacy_orders or legacy_discounts:
+            self._pending_order_lines = [
+                orjson.dumps(self._order_record(order)) for order in self.orders
+            ]
+            self._pending_discount_lines = [
+                orjson.dumps(self._discount_record(dc)) for dc in self.discount_codes
+            ]
+            self._mark_dirty()
     
-    def _save_data(self) -> None:
+    def _read_snapshot(self) -> dict:
         """
-        Save current state to JSON file
+        Read the data file (carts and counters)
+        
+        Returns:
+            Decoded data, or an empty dict if the file is missing or corrupt
         """
+        data_path = Path(self.data_file)
+        if not data_path.exists():
+            return {}
         try:
-            data_path = Path(self.data_file)
-            # Create directory if it doesn't exist
-            data_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(data_path, 'rb') as f:
+                data = orjson.loads(f.read())
+            if not isinstance(data, dict):
+                raise TypeError(f"expected an object, got {type(data).__name__}")
+        except (OSError, orjson.JSONDecodeError, TypeError) as e:
+            # Only carts and counters live here; the logs are still replayed
+            print(f"Could not load data from {self.data_file}: {e}. "
+                  f"Starting with empty carts; orders and discount codes come from the logs.")
+            return {}
+        return data
+    
+    def _clear_data(self) -> None:
+        """
+        Empty all in-memory data and drop pending log records
+        """
+        self.carts = {}
+        self.orders = []
+        self.discount_codes = []
+        self._discount_index = {}
+        self._discount_entries = {}
+        self.order_count = 0
+        self._next_order_seq = 1
+        self._next_discount_seq = 1
+        self._total_items_purchased = 0
+        self._total_purchase_amount = 0.0
+        self._total_discount_amount = 0.0
+        self._pending_order_lines = []
+        self._pending_discount_lines = []
+    
+    def _append_log(self, log_file: str, lines: List[bytes]) -> None:
+        """
+        Append encoded records to a JSONL log, one per line
+        
+        Args:
+            log_file: Path to the log
+            lines: Encoded records (without newlines)
+        """
+        data = b"".join(line + b"\n" for line in lines)
+        with open(log_file, 'a+b') as f:
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # End a line torn by an earlier failed write so it stays separate
+                    data = b"\n" + data
+            f.write(data)
+    
+    def _read_log(self, log_file: str) -> List[dict]:
+        """
+        Read all records from a JSONL log, skipping a torn trailing line
+        
+        Args:
+            log_file: Path to the log
             
-            # Prepare data for serialization
-            data = {
-                'n': self.n,
-                'order_count': self.order_count,
-                'carts': {
-                    user_id: {
-                        'user_id': cart.user_id,
-                        'items': [item.model_dump() for item in cart.items]
-                    }
-                    for user_id, cart in self.carts.items()
-                },
-                'orders': [
-                    {
-                        'order_id': order.order_id,
-                        'user_id': order.user_id,
-                        'items': order.items,
-                        'subtotal': order.subtotal,
-                        'discount_code': order.discount_code,
-                        'discount_amount': order.discount_amount,
-                        'total': order.total,
-                        'created_at': order.created_at.isoformat()
-                    }
-                    for order in self.orders
-                ],
-                'discount_codes': [
-                    {
-                        'code': dc.code,
-                        'discount_percent': dc.discount_percent,
-                        'created_at': dc.created_at.isoformat(),
-                        'used': dc.used,
-                        'used_at': dc.used_at.isoformat() if dc.used_at else None
-                    }
-                    for dc in self.discount_codes
-                ]
+        Returns:
+            Decoded records in file order
+        """
+        records = []
+        if not Path(log_file).exists():
+            return records
+        with open(log_file, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError as e:
+                    print(f"Skipping unreadable record in {log_file}: {e}")
+        return records
+    
+    def _sequence_number(self, identifier: str) -> int:
+        """
+        Get the number at the end of an order id or discount code
+        (e.g. 12 for "ORD-000012"), or 0 if there is none
+        """
+        try:
+            return int(identifier.rsplit('-', 1)[-1])
+        except ValueError:
+            return 0
+    
+    def _order_record(self, order: Order) -> dict:
+        """
+        Convert an order to its log record
+        """
+        return {
+            'order_id': order.order_id,
+            'user_id': order.user_id,
+            'items': order.items,
+            'subtotal': order.subtotal,
+            'discount_code': order.discount_code,
+            'discount_amount': order.discount_amount,
+            'total': order.total,
+            'created_at': order.created_at,
+            'items_quantity_total': order.items_quantity_total
+        }
+    
+    def _discount_entry(self, discount: DiscountCode) -> dict:
+        """
+        Convert a discount code to its get_statistics() entry
+        """
+        return {
+            "code": discount.code,
+            "created_at": discount.created_at.isoformat(),
+            "used": discount.used,
+            "used_at": discount.used_at.isoformat() if discount.used_at else None
+        }
+    
+    def _discount_record(self, discount: DiscountCode) -> dict:
+        """
+        Convert a discount code to its log record
+        """
+        return {
+            'code': discount.code,
+            'discount_percent': discount.discount_percent,
+            'created_at': discount.created_at,
+            'used': discount.used,
+            'used_at': discount.used_at
+        }
+    
+    def _parse_order(self, order_data: dict) -> Order:
+        """
+        Build an order from a stored record
+        
+        Raises:
+            KeyError, TypeError, ValueError: If the record is malformed
+                (pydantic's ValidationError is a ValueError)
+        """
+        if 'items_quantity_total' not in order_data:
+            # Records written before the field existed
+            order_data['items_quantity_total'] = sum(item['quantity'] for item in order_data['items'])
+        # Validated once at load time, so later code can trust the fields
+        return Order.model_validate(order_data)
+    
+    def _parse_discount(self, dc_data: dict) -> DiscountCode:
+        """
+        Build a discount code from a stored record
+        
+        Raises:
+            TypeError, ValueError: If the record is malformed
+        """
+        return DiscountCode.model_validate(dc_data)
+    
+    def _serialize_data(self) -> bytes:
+        """
+        Serialize carts and counters to JSON bytes
+        
+        Runs under the store lock only, so carts may change meanwhile; the
+        list() copies are taken in one step so iteration never sees a
+        dictionary change size.
+        """
+        data = {
+            'n': self.n,
+            'order_count': self.order_count,
+            'carts': {
+                user_id: {
+                    'user_id': user_id,
+                    'items': list(items.values())
+                }
+                for user_id, items in list(self.carts.items())
             }
-            
-            # Write to file atomically (write to temp file, then rename)
-            temp_file = str(data_path) + '.tmp'
-            with open(temp_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            
-            # Atomic rename
-            os.replace(temp_file, data_path)
-            
-        except Exception as e:
-            print(f"Error saving data to {self.data_file}: {e}")
-            # Don't raise - allow operations to continue even if save fails
-
+        }
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
@@ -0,0 +1,50 @@
+"""
+Request body validation helpers for the e-commerce API
+Validates raw JSON bodies with prebuilt TypeAdapters in a single pass
+"""
+from typing import Any, Dict, Type, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+T = TypeVar("T")
+
+async def parse_body(adapter: TypeAdapter[T], request: Request) -> T:
+    """
+    Parse and validate the JSON request body
+
+    Args:
+        adapter: Module-level TypeAdapter for the request model
+        request: Incoming request
+
+    Returns:
+        Validated request model
+
+    Raises:
+        RequestValidationError: If the body is not valid JSON for the model (422)
+    """
+    try:
+        return adapter.validate_json(await request.body())
+    except ValidationError as e:
+        # Match FastAPI's own error locations, e.g. ("body", "price")
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+def json_body_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Build openapi_extra documenting a JSON request body
+
+    Args:
+        model: Request model the endpoint validates manually
+
+    Returns:
+        openapi_extra dict for the route decorator
+    """
+    return {
+        "requestBody": {
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+            "required": True,
+        }
+    }
@@ -2,14 +2,31 @@
 E-commerce Store Backend API
 Main application entry point
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import cart, checkout, admin
 from app.store import Store
 
+# How often pending store changes are written to disk (seconds)
+FLUSH_INTERVAL = 0.1
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the store's background writer and save any pending changes on shutdown"""
+    store = app.state.store
+    store.start_writer(FLUSH_INTERVAL)
+    try:
+        yield
+    finally:
+        store.stop_writer()
+
 # Initialize FastAPI app with enhanced Swagger documentation
 app = FastAPI(
     title="E-commerce Store API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     version="1.0.0",
     description="""
     ## E-commerce Store Backend API
@@ -44,7 +61,8 @@ app = FastAPI(
     * `GET /api/admin/statistics` - Get store statistics
     
     ### Notes
-    * All data is persisted to `data/store.json` (automatically created)
+    * All data is persisted under `data/` (`store.json` plus order and discount logs, automatically created)
+    * Changes are batched and written to disk every 100ms and on shutdown
     * Data persists across server restarts
     * Use Swagger UI at `/docs` for interactive API testing
     """,
@@ -91,7 +109,7 @@ app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.state.store = store
 
 @app.get("/")
-def root():
+async def root():
     """Health check endpoint"""
     return {"message": "E-commerce Store API is running"}
 
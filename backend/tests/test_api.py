@@ -1,182 +1,248 @@
 """
 Unit tests for API endpoints
 """
+import asyncio
+import httpx
+import orjson
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from main import app
+from app.dependencies import get_store
 from app.store import Store
 
+# URLs used across tests
+CART_ADD_URL = "/api/cart/user1/add"
+CART_GET_URL = "/api/cart/user1"
+CART_REMOVE_URL = "/api/cart/user1/item/item1"
+CART_CLEAR_URL = "/api/cart/user1/clear"
+CHECKOUT_URL = "/api/checkout/user1"
+GENERATE_CODE_URL = "/api/admin/discount-code/generate"
+STATISTICS_URL = "/api/admin/statistics"
+
+# Request bodies shared across tests, encoded once
+JSON_HEADERS = {"content-type": "application/json"}
+ITEM1_QTY2 = {"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
+ITEM1_BODY = orjson.dumps(ITEM1_QTY2)
+ITEM1_PRICE100_BODY = orjson.dumps({"item_id": "item1", "name": "Product 1", "price": 100.0, "quantity": 1})
+EMPTY_BODY = b"{}"
+
+@pytest.fixture(scope="module")
+def store():
+    """Create one in-memory store, shared by the module"""
+    # No data files, so pytest-xdist workers have nothing to share
+    return Store(n=5, persist=False)
+
+@pytest.fixture(autouse=True)
+def _reset_store(store):
+    """Start every test with an empty store"""
+    store.reset()
+    store.n = 5
+
+@pytest.fixture(scope="session")
+def app_instance():
+    """Import the app once per session, with its OpenAPI schema already built"""
+    from main import app
+    # Build the schema up front instead of during the first test that needs it
+    app.openapi()
+    return app
+
+@pytest.fixture(scope="session")
+def raw_client(app_instance):
+    """Create one test client, running app startup/shutdown once per session"""
+    with TestClient(app_instance) as test_client:
+        yield test_client
+
 @pytest.fixture
-def client():
-    """Create a test client with isolated store"""
-    import tempfile
-    import os
-    # Create a temporary data file for each test
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
-    temp_file.close()
-    
-    # Create a new store instance for testing with isolated data file
-    store = Store(n=5, data_file=temp_file.name)
-    app.state.store = store
-    
-    yield TestClient(app)
-    
-    # Cleanup: remove temporary file after test
-    try:
-        os.unlink(temp_file.name)
-    except:
-        pass
+def client(app_instance, raw_client, store):
+    """Point the shared test client's routes at the test store"""
+    # Override the dependency rather than replacing app.state.store
+    app_instance.dependency_overrides[get_store] = lambda: store
+    yield raw_client
+    app_instance.dependency_overrides.clear()
+
+@pytest_asyncio.fixture
+async def aclient(app_instance, store):
+    """Async client calling the app in-process, for tests that send requests concurrently"""
+    app_instance.dependency_overrides[get_store] = lambda: store
+    transport = httpx.ASGITransport(app=app_instance)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as async_client:
+        yield async_client
+    app_instance.dependency_overrides.clear()
+
+def _json(response):
+    """Decode a response body with orjson"""
+    return orjson.loads(response.content)
+
+def _seed_cart(client, user_id, bodies):
+    """Add items (pre-encoded JSON bodies) to a user's cart through the API"""
+    for body in bodies:
+        response = client.post(f"/api/cart/{user_id}/add", content=body, headers=JSON_HEADERS)
+        assert response.status_code == 200
+
+@pytest.fixture
+def seeded_cart(client):
+    """Client for a store where user1's cart already holds item1 (quantity 2)"""
+    _seed_cart(client, "user1", [ITEM1_BODY])
+    return client
 
 class TestCartAPI:
     """Test cases for Cart API endpoints"""
     
     def test_add_item_to_cart(self, client):
         """Test adding item to cart via API"""
-        response = client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
+        response = client.post(CART_ADD_URL, content=ITEM1_BODY, headers=JSON_HEADERS)
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["user_id"] == "user1"
-        assert len(data["items"]) == 1
+        assert data["item_count"] == 1
         assert data["items"][0]["item_id"] == "item1"
     
-    def test_get_cart(self, client):
-        """Test getting cart via API"""
-        # Add item first
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
+    def test_add_invalid_item_to_cart(self, client):
+        """Test that an invalid item body is rejected with 422"""
+        response = client.post(
+            CART_ADD_URL,
+            json={**ITEM1_QTY2, "price": -1}
         )
-        
-        response = client.get("/api/cart/user1")
+        assert response.status_code == 422
+        assert _json(response)["detail"][0]["loc"] == ["body", "price"]
+    
+    def test_get_cart(self, seeded_cart):
+        """Test getting cart via API"""
+        response = seeded_cart.get(CART_GET_URL)
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["user_id"] == "user1"
-        assert len(data["items"]) == 1
+        assert data["item_count"] == 1
+    
+    def test_get_cart_summary(self, seeded_cart):
+        """Test getting only the cart totals via API"""
+        response = seeded_cart.get(CART_GET_URL, params={"summary": "true"})
+        assert response.status_code == 200
+        assert _json(response) == {"user_id": "user1", "item_count": 1, "subtotal": 20.0}
     
-    def test_remove_item_from_cart(self, client):
+    def test_remove_item_from_cart(self, seeded_cart):
         """Test removing item from cart via API"""
-        # Add item first
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
-        
-        response = client.delete("/api/cart/user1/item/item1")
+        response = seeded_cart.delete(CART_REMOVE_URL)
         assert response.status_code == 200
-        data = response.json()
-        assert len(data["items"]) == 0
+        data = _json(response)
+        assert data["item_count"] == 0
     
-    def test_clear_cart(self, client):
+    def test_clear_cart(self, seeded_cart, store):
         """Test clearing cart via API"""
-        # Add item first
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
-        
-        response = client.delete("/api/cart/user1/clear")
+        response = seeded_cart.delete(CART_CLEAR_URL)
         assert response.status_code == 200
         
-        # Verify cart is empty
-        response = client.get("/api/cart/user1")
-        assert len(response.json()["items"]) == 0
+        # Verify cart is empty straight from the store the routes use
+        assert store.get_cart("user1") is None
 
 class TestCheckoutAPI:
     """Test cases for Checkout API endpoints"""
     
-    def test_checkout_without_discount(self, client):
+    def test_checkout_without_discount(self, seeded_cart):
         """Test checkout without discount code"""
-        # Add items to cart
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
-        
-        response = client.post(
-            "/api/checkout/user1",
-            json={}
-        )
+        response = seeded_cart.post(CHECKOUT_URL, content=EMPTY_BODY, headers=JSON_HEADERS)
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["user_id"] == "user1"
         assert data["subtotal"] == 20.0
         assert data["total"] == 20.0
         assert data["discount_code"] is None
     
-    def test_checkout_with_valid_discount(self, client):
+    def test_checkout_with_valid_discount(self, client, store):
         """Test checkout with valid discount code"""
-        # Generate discount code
-        discount_response = client.post("/api/admin/discount-code/generate")
-        discount_code = discount_response.json()["code"]
+        # Create the code directly on the store, no API round trip needed
+        discount_code = store.generate_discount_code().code
         
         # Add items to cart
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 100.0, "quantity": 1}
-        )
+        _seed_cart(client, "user1", [ITEM1_PRICE100_BODY])
         
         response = client.post(
-            "/api/checkout/user1",
+            CHECKOUT_URL,
             json={"discount_code": discount_code}
         )
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert data["discount_code"] == discount_code
         assert data["discount_amount"] == 10.0
         assert data["total"] == 90.0
     
-    def test_checkout_with_invalid_discount(self, client):
+    def test_checkout_with_invalid_discount(self, seeded_cart):
         """Test checkout with invalid discount code"""
-        # Add items to cart
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
-        
-        response = client.post(
-            "/api/checkout/user1",
+        response = seeded_cart.post(
+            CHECKOUT_URL,
             json={"discount_code": "INVALID"}
         )
         assert response.status_code == 400
     
-    def test_checkout_empty_cart(self, client):
-        """Test checkout with empty cart"""
+    def test_checkout_malformed_json(self, client):
+        """Test that a body that is not valid JSON is rejected with 422"""
         response = client.post(
-            "/api/checkout/user1",
-            json={}
+            CHECKOUT_URL,
+            content=b"{not json",
+            headers={"content-type": "application/json"}
         )
+        assert response.status_code == 422
+        assert _json(response)["detail"][0]["type"] == "json_invalid"
+    
+    def test_checkout_empty_cart(self, client):
+        """Test checkout with empty cart"""
+        response = client.post(CHECKOUT_URL, content=EMPTY_BODY, headers=JSON_HEADERS)
         assert response.status_code == 400
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_checkouts(self, aclient):
+        """Test checkouts for many users sent at the same time"""
+        users = [f"user{i}" for i in range(10)]
+        responses = await asyncio.gather(*(
+            aclient.post(f"/api/cart/{user_id}/add", content=ITEM1_BODY, headers=JSON_HEADERS)
+            for user_id in users
+        ))
+        assert all(response.status_code == 200 for response in responses)
+        
+        responses = await asyncio.gather(*(
+            aclient.post(f"/api/checkout/{user_id}", content=EMPTY_BODY, headers=JSON_HEADERS)
+            for user_id in users
+        ))
+        assert all(response.status_code == 200 for response in responses)
+        assert len({_json(response)["order_id"] for response in responses}) == 10
+        
+        data = _json(await aclient.get(STATISTICS_URL))
+        assert data["total_orders"] == 10
+        assert data["total_purchase_amount"] == 200.0
 
 class TestAdminAPI:
     """Test cases for Admin API endpoints"""
     
     def test_generate_discount_code(self, client):
         """Test generating discount code via admin API"""
-        response = client.post("/api/admin/discount-code/generate")
+        response = client.post(GENERATE_CODE_URL)
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "code" in data
         assert data["discount_percent"] == 10
         assert data["used"] is False
     
-    def test_get_statistics(self, client):
+    def test_get_statistics(self, seeded_cart):
         """Test getting statistics via admin API"""
-        # Create some orders first
-        client.post(
-            "/api/cart/user1/add",
-            json={"item_id": "item1", "name": "Product 1", "price": 10.0, "quantity": 2}
-        )
-        client.post("/api/checkout/user1", json={})
+        # Create an order first
+        seeded_cart.post(CHECKOUT_URL, content=EMPTY_BODY, headers=JSON_HEADERS)
         
-        response = client.get("/api/admin/statistics")
+        response = seeded_cart.get(STATISTICS_URL)
         assert response.status_code == 200
-        data = response.json()
+        data = _json(response)
         assert "total_items_purchased" in data
         assert "total_purchase_amount" in data
         assert "discount_codes" in data
         assert "total_discount_amount" in data
         assert data["total_orders"] == 1
-
+    
+    @pytest.mark.asyncio
+    async def test_statistics_refresh_after_change(self, aclient):
+        """Test that repeated statistics calls pick up new discount codes"""
+        first, second = await asyncio.gather(aclient.get(STATISTICS_URL), aclient.get(STATISTICS_URL))
+        assert _json(first) == _json(second)
+        
+        await aclient.post(GENERATE_CODE_URL)
+        
+        data = _json(await aclient.get(STATISTICS_URL))
+        assert len(data["discount_codes"]) == len(_json(first)["discount_codes"]) + 1
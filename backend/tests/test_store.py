@@ -1,24 +1,24 @@
 """
 Unit tests for the Store class
 """
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import pytest
-import tempfile
-import os
-from app.store import Store
-from app.models import CartItem
+import orjson
+from app.store import CART_LOCK_STRIPES, Store
+from app.models import Cart, CartItem
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def temp_store():
-    """Create a store with temporary data file"""
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.json')
-    temp_file.close()
-    store = Store(n=5, data_file=temp_file.name)
-    yield store
-    # Cleanup
-    try:
-        os.unlink(temp_file.name)
-    except:
-        pass
+    """Create one in-memory store, shared by the module"""
+    # Persistence tests build their own store on tmp_path
+    return Store(n=5, persist=False)
+
+@pytest.fixture(autouse=True)
+def _reset_store(temp_store):
+    """Start every test with an empty store"""
+    temp_store.reset()
+    temp_store.n = 5
 
 class TestStore:
     """Test cases for Store functionality"""
@@ -26,28 +26,43 @@ class TestStore:
     def test_get_or_create_cart(self, temp_store):
         """Test creating a new cart"""
         cart = temp_store.get_or_create_cart("user1")
-        assert cart.user_id == "user1"
-        assert len(cart.items) == 0
+        assert cart["user_id"] == "user1"
+        assert len(cart["items"]) == 0
     
     def test_add_item_to_cart(self, temp_store):
         """Test adding items to cart"""
         cart = temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
-        assert len(cart.items) == 1
-        assert cart.items[0].item_id == "item1"
-        assert cart.items[0].quantity == 2
+        assert len(cart["items"]) == 1
+        assert cart["items"][0]["item_id"] == "item1"
+        assert cart["items"][0]["quantity"] == 2
+    
+    def test_cart_item_count_follows_items(self):
+        """Test that item_count is derived from the items of any Cart"""
+        item = CartItem(item_id="item1", name="Product 1", price=10.0, quantity=2)
+        cart = Cart(user_id="user1", items=[item])
+        assert cart.item_count == 1
+        assert cart.model_dump()["item_count"] == 1
     
     def test_add_same_item_twice(self, temp_store):
         """Test adding the same item twice increases quantity"""
         temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
         cart = temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 3)
-        assert len(cart.items) == 1
-        assert cart.items[0].quantity == 5
+        assert len(cart["items"]) == 1
+        assert cart["items"][0]["quantity"] == 5
     
     def test_remove_item_from_cart(self, temp_store):
         """Test removing an item from cart"""
         temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
         cart = temp_store.remove_item_from_cart("user1", "item1")
-        assert len(cart.items) == 0
+        assert len(cart["items"]) == 0
+    
+    def test_cart_matches_cart_model(self, temp_store):
+        """Test that the plain-data cart the store returns has the Cart model's shape"""
+        temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
+        data = temp_store.add_item_to_cart("user1", "item2", "Product 2", 5.0, 1)
+        assert data == Cart.model_validate(data).model_dump()
+        assert temp_store.get_cart("user1") == data
+        assert temp_store.remove_item_from_cart("user1", "item2")["item_count"] == 1
     
     def test_create_order(self, temp_store):
         """Test creating an order"""
@@ -91,9 +106,7 @@ class TestStore:
         assert len(temp_store.discount_codes) == 0
         
         # Create 3 orders
-        for i in range(3):
-            temp_store.add_item_to_cart(f"user{i}", "item1", "Product 1", 10.0, 1)
-            temp_store.create_order(f"user{i}")
+        temp_store._simulate_orders(3)
         
         # Should have generated 1 discount code
         assert len(temp_store.discount_codes) == 1
@@ -108,4 +121,181 @@ class TestStore:
         assert stats["total_items_purchased"] == 3
         assert stats["total_purchase_amount"] == 40.0
         assert stats["total_orders"] == 1
-
+    
+    def test_flush_persists_changes(self, tmp_path):
+        """Test that changes are written on flush and reloaded by a new store"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
+        store.create_order("user1")
+        assert store.flush() is True
+        assert store.flush() is False  # Nothing new to write
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert len(reloaded.orders) == 1
+        assert reloaded.orders[0].subtotal == 20.0
+        assert reloaded.get_statistics()["total_items_purchased"] == 2
+    
+    def test_failed_flush_is_retried(self, tmp_path):
+        """Test that orders from a failed write are kept and written by the next flush"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 1)
+        store.create_order("user1")
+        
+        # A directory in place of the orders log makes the append fail
+        Path(store.orders_file).mkdir()
+        assert store.flush() is False
+        Path(store.orders_file).rmdir()
+        
+        store.add_item_to_cart("user2", "item1", "Product 1", 10.0, 1)
+        store.create_order("user2")
+        assert store.flush() is True
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert [order.order_id for order in reloaded.orders] == ["ORD-000001", "ORD-000002"]
+    
+    def test_sequences_continue_after_skipped_records(self, tmp_path):
+        """Test that ids and codes are not reissued when log records can't be read"""
+        store = Store(n=1, data_file=str(tmp_path / "store.json"))
+        for user_id in ("user1", "user2"):
+            store.add_item_to_cart(user_id, "item1", "Product 1", 10.0, 1)
+            store.create_order(user_id)
+        store.flush()
+        
+        # Corrupt the first record of each log
+        for log_file in (store.orders_file, store.discounts_file):
+            lines = Path(log_file).read_bytes().splitlines(keepends=True)
+            Path(log_file).write_bytes(b"{corrupt\n" + b"".join(lines[1:]))
+        
+        reloaded = Store(n=1, data_file=store.data_file)
+        assert len(reloaded.orders) == 1
+        reloaded.add_item_to_cart("user3", "item1", "Product 1", 10.0, 1)
+        assert reloaded.create_order("user3").order_id == "ORD-000003"
+        assert reloaded.discount_codes[-1].code == "SAVE10-0003"
+    
+    def test_corrupt_data_file_keeps_logged_orders(self, tmp_path):
+        """Test that a corrupt data file loses only carts, not the logged orders"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        for user_id in ("user1", "user2"):
+            store.add_item_to_cart(user_id, "item1", "Product 1", 10.0, 1)
+            store.create_order(user_id)
+        store.add_item_to_cart("user3", "item1", "Product 1", 10.0, 1)
+        store.flush()
+        Path(store.data_file).write_bytes(b"{corrupt")
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert len(reloaded.orders) == 2
+        assert reloaded.get_cart("user3") is None
+        reloaded.add_item_to_cart("user3", "item1", "Product 1", 10.0, 1)
+        assert reloaded.create_order("user3").order_id == "ORD-000003"
+        reloaded.flush()
+        
+        stats = Store(n=5, data_file=store.data_file).get_statistics()
+        assert stats["total_orders"] == 3
+        assert stats["total_purchase_amount"] == 30.0
+    
+    def test_invalid_log_record_is_skipped(self, tmp_path):
+        """Test that one malformed log record is skipped, not the whole store"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        for user_id in ("user1", "user2"):
+            store.add_item_to_cart(user_id, "item1", "Product 1", 10.0, 1)
+            store.create_order(user_id)
+        discount = store.generate_discount_code()
+        store.flush()
+        with open(store.orders_file, 'ab') as f:
+            f.write(b'{"order_id":"X"}\n')
+        with open(store.discounts_file, 'ab') as f:
+            f.write(b'{"code":"SAVE10-9999","created_at":"not a date"}\n')
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert [order.order_id for order in reloaded.orders] == ["ORD-000001", "ORD-000002"]
+        assert reloaded.validate_discount_code(discount.code) is not None
+        reloaded.add_item_to_cart("user3", "item1", "Product 1", 10.0, 1)
+        assert reloaded.create_order("user3").order_id == "ORD-000003"
+    
+    def test_background_writer_saves_on_stop(self, tmp_path):
+        """Test that the background writer saves pending changes when stopped"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        store.start_writer(flush_interval=0.01)
+        store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 2)
+        store.stop_writer()
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert reloaded.get_cart("user1")["items"][0]["quantity"] == 2
+    
+    def test_memory_only_store_writes_nothing(self, tmp_path):
+        """Test that a store created with persist=False never touches the disk"""
+        store = Store(n=1, data_file=str(tmp_path / "store.json"), persist=False)
+        store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 1)
+        store.create_order("user1")
+        
+        assert store.flush() is False
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_reset_refuses_persistent_store(self, tmp_path):
+        """Test that reset() can't desync a store from its logs on disk"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        with pytest.raises(RuntimeError):
+            store.reset()
+    
+    def test_discount_usage_survives_reload(self, tmp_path):
+        """Test that the discount log replays both creation and use of a code"""
+        store = Store(n=5, data_file=str(tmp_path / "store.json"))
+        discount = store.generate_discount_code()
+        store.add_item_to_cart("user1", "item1", "Product 1", 100.0, 1)
+        store.create_order("user1", discount_code=discount.code)
+        store.flush()
+        
+        reloaded = Store(n=5, data_file=store.data_file)
+        assert len(reloaded.discount_codes) == 1
+        assert reloaded.discount_codes[0].used is True
+        assert reloaded.validate_discount_code(discount.code) is None
+        assert reloaded.get_statistics()["total_discount_amount"] == 10.0
+    
+    def test_get_statistics_json_matches_get_statistics(self, temp_store):
+        """Test that the pre-encoded statistics match the dict version"""
+        discount = temp_store.generate_discount_code()
+        temp_store.generate_discount_code()
+        temp_store.add_item_to_cart("user1", "item1", "Product 1", 100.0, 1)
+        temp_store.create_order("user1", discount_code=discount.code)
+        
+        assert orjson.loads(temp_store.get_statistics_json()) == temp_store.get_statistics()
+    
+    def test_reset_empties_store(self, temp_store):
+        """Test that reset discards carts, orders and discount codes"""
+        discount = temp_store.generate_discount_code()
+        temp_store.add_item_to_cart("user1", "item1", "Product 1", 10.0, 1)
+        temp_store.add_item_to_cart("user2", "item1", "Product 1", 10.0, 1)
+        temp_store.create_order("user2")
+        
+        temp_store.reset()
+        assert temp_store.get_cart("user1") is None
+        assert temp_store.validate_discount_code(discount.code) is None
+        assert temp_store.get_statistics()["total_orders"] == 0
+    
+    def test_cart_locks_do_not_grow(self, temp_store):
+        """Test that looking up unknown users doesn't allocate locks"""
+        for i in range(1000):
+            assert temp_store.get_cart(f"nobody{i}") is None
+        assert len(temp_store._cart_locks) == CART_LOCK_STRIPES
+    
+    def test_concurrent_carts(self, temp_store):
+        """Test that carts and orders stay consistent under concurrent access"""
+        users = [f"user{i}" for i in range(100)]
+        
+        # Every user gets 10 single-unit adds, spread over the threads so the
+        # same cart is updated from several threads at once
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(
+                lambda user_id: temp_store.add_item_to_cart(user_id, "item1", "Product 1", 1.0, 1),
+                users * 10
+            ))
+        for user_id in users:
+            assert temp_store.get_cart(user_id)["items"][0]["quantity"] == 10
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            orders = list(pool.map(temp_store.create_order, users))
+        assert len({order.order_id for order in orders}) == 100
+        assert all(order.total == 10.0 for order in orders)
+        assert all(temp_store.get_cart(user_id) is None for user_id in users)
+        assert len(temp_store.discount_codes) == 100 // temp_store.n
+        assert temp_store.get_statistics()["total_items_purchased"] == 1000
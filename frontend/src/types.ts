@@ -8,6 +8,13 @@ export interface CartItem {
 export interface Cart {
   user_id: string;
   items: CartItem[];
+  item_count: number;
+}
+
+export interface CartSummary {
+  user_id: string;
+  item_count: number;
+  subtotal: number;
 }
 
 export interface Order {